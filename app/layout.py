@@ -1,7 +1,42 @@
 import streamlit as st
 import json
+from io import BytesIO
+
+try:
+    import orjson
+except ImportError:  # optional speedup, stdlib json is the fallback
+    orjson = None
+
 from core.prompt_templates import PromptTemplates
 
+@st.cache_data(show_spinner=False)
+def _serialize_json(data):
+    """Serialize a result dict once per distinct value instead of per rerun."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(data, indent=4)
+
+def _serialize_to_bytes(obj) -> bytes:
+    """Serialize to UTF-8 JSON bytes without building one big intermediate string."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    # Stream the stdlib encoder's chunks into a buffer instead of allocating
+    # the whole indented string and then encoding it a second time
+    buffer = BytesIO()
+    for chunk in json.JSONEncoder(indent=4).iterencode(obj):
+        buffer.write(chunk.encode())
+    return buffer.getvalue()
+
+@st.cache_data(show_spinner=False)
+def _full_report_bytes(data, validation, extraction_time):
+    """Build and serialize the full report only when its inputs change."""
+    full_report = {
+        "extracted_data": data,
+        "validation_report": validation,
+        "extraction_timestamp": extraction_time
+    }
+    return _serialize_to_bytes(full_report)
+
 def set_page_config():
     st.set_page_config(
         page_title="AI-Powered Invoice Parser",
@@ -16,43 +51,55 @@ def display_header():
         "and let the AI extract the data for you."
     )
 
+def _build_template_index():
+    """Flatten all templates into {template_key: info} for O(1) lookups."""
+    flat_index = {}
+    for category_name, templates in PromptTemplates.get_all_templates().items():
+        for template_key, template_info in templates.items():
+            flat_index[template_key] = {
+                "prompt": template_info["prompt"],
+                "description": template_info["description"],
+                "category": category_name,
+                "display_name": f"{category_name}: {template_info['name']}"
+            }
+    return flat_index
+
+# Templates are static code, so build the selector data once at import time;
+# the tuple's cached hash also lets selectbox skip rehashing its options
+_TEMPLATE_INDEX = _build_template_index()
+_TEMPLATE_OPTIONS = ("Custom Prompt",) + tuple(info["display_name"] for info in _TEMPLATE_INDEX.values())
+_TEMPLATE_MAPPING = {info["display_name"]: key for key, info in _TEMPLATE_INDEX.items()}
+
 def display_template_selector():
     """Display template selector in sidebar."""
     st.subheader("Quick Templates")
-    
-    # Get all templates
-    all_templates = PromptTemplates.get_all_templates()
-    
-    # Create selectbox for templates
-    template_options = ["Custom Prompt"]
-    template_mapping = {}
-    
-    for category_name, templates in all_templates.items():
-        for template_key, template_info in templates.items():
-            display_name = f"{category_name}: {template_info['name']}"
-            template_options.append(display_name)
-            template_mapping[display_name] = template_key
-    
+
     selected_template = st.selectbox(
         "Choose a template or use custom prompt:",
-        options=template_options,
+        options=_TEMPLATE_OPTIONS,
         help="Select a pre-defined template for common extraction scenarios"
     )
-    
+
     if selected_template != "Custom Prompt":
-        template_key = template_mapping[selected_template]
-        template_prompt = PromptTemplates.get_template_by_name(template_key)
-        
+        template_info = _TEMPLATE_INDEX[_TEMPLATE_MAPPING[selected_template]]
+
         # Show template description
-        for templates in all_templates.values():
-            if template_key in templates:
-                st.info(f"📝 {templates[template_key]['description']}")
-                break
-        
-        return template_prompt
-    
+        st.info(f"📝 {template_info['description']}")
+
+        return template_info["prompt"]
+
     return None
 
+# st.fragment (Streamlit 1.33+) scopes reruns to the decorated function, so
+# sidebar interactions no longer re-execute the whole results widget tree
+def _fragment(func):
+    if hasattr(st, "fragment"):
+        return st.fragment(func)
+
+    # Pre-1.33 fallback: fragments don't exist, so just render normally
+    return func
+
+@_fragment
 def display_results(result):
     st.subheader("Extraction Results")
     if result.get("success"):
@@ -61,59 +108,59 @@ def display_results(result):
         # Display validation summary if available
         if "validation" in result:
             validation = result["validation"]
+            summary = validation.get("summary") or {}
+            warnings = validation.get("warnings")
+            errors = validation.get("errors")
             col1, col2, col3 = st.columns(3)
-            
+
             with col1:
-                st.metric("Fields Extracted", validation.get("summary", {}).get("total_fields", 0))
+                st.metric("Fields Extracted", summary.get("total_fields", 0))
             with col2:
-                st.metric("Valid Fields", validation.get("summary", {}).get("valid_fields", 0))
+                st.metric("Valid Fields", summary.get("valid_fields", 0))
             with col3:
-                error_count = validation.get("summary", {}).get("error_count", 0)
-                st.metric("Errors", error_count, delta_color="inverse")
-            
-            # Show warnings if any
-            if validation.get("warnings"):
+                st.metric("Errors", summary.get("error_count", 0), delta_color="inverse")
+
+            # Show warnings if any - one markdown list beats a widget per item
+            if warnings:
                 st.warning("⚠️ Validation Warnings:")
-                for warning in validation["warnings"]:
-                    st.write(f"• {warning}")
-            
+                st.markdown("\n".join("- " + warning for warning in warnings))
+
             # Show errors if any
-            if validation.get("errors"):
+            if errors:
                 st.error("❌ Validation Errors:")
-                for error in validation["errors"]:
-                    st.write(f"• {error}")
+                st.markdown("\n".join("- " + error for error in errors))
         
-        # Display the extracted data
+        # Display the extracted data - serialize once and reuse for the download
         st.subheader("Extracted Data")
-        st.json(result.get("data", {}))
+        data_json = _serialize_json(result.get("data", {}))
+        st.json(data_json)
         
         # Provide download options
         col1, col2 = st.columns(2)
         
         with col1:
             # Download JSON
-            json_string = json.dumps(result.get("data", {}), indent=4)
             st.download_button(
                 label="📥 Download as JSON",
                 file_name="extracted_data.json",
                 mime="application/json",
-                data=json_string,
+                data=data_json,
                 use_container_width=True
             )
         
         with col2:
             # Download full report including validation
-            full_report = {
-                "extracted_data": result.get("data", {}),
-                "validation_report": result.get("validation", {}),
-                "extraction_timestamp": st.session_state.get("extraction_time", "")
-            }
-            report_string = json.dumps(full_report, indent=4)
+            extraction_time = st.session_state.get("extraction_time", "")
+            report_bytes = _full_report_bytes(
+                result.get("data", {}),
+                result.get("validation", {}),
+                extraction_time
+            )
             st.download_button(
                 label="📊 Download Full Report",
                 file_name="extraction_report.json",
                 mime="application/json",
-                data=report_string,
+                data=report_bytes,
                 use_container_width=True
             )
         
@@ -130,10 +177,9 @@ def display_results(result):
             st.subheader("Raw LLM Output (for debugging)")
             st.code(result.get("raw_output"), language="text")
 
-def display_invoice_examples():
-    """Display example invoices that the system can handle."""
-    with st.expander("📋 Supported Invoice Types & Examples"):
-        st.markdown("""
+# Static expander body, hoisted so the multi-kB string is allocated once at
+# import instead of on every rerun
+_EXAMPLES_MD = """
         **This system can handle various invoice formats:**
         
         🇮🇳 **Indian GST Invoices**
@@ -161,7 +207,12 @@ def display_invoice_examples():
         - Try the pre-defined templates
         - Upload high-quality PDF files
         - Specify exactly what fields you need
-        """)
+        """
+
+def display_invoice_examples():
+    """Display example invoices that the system can handle."""
+    with st.expander("📋 Supported Invoice Types & Examples"):
+        st.markdown(_EXAMPLES_MD)
 
 def display_sidebar_content():
     """Display all sidebar content including controls and templates."""
@@ -177,42 +228,45 @@ def display_sidebar_content():
     
     # Template selector
     template_prompt = display_template_selector()
-    
-    # Prompt input
-    default_prompt = template_prompt or "Extract the invoice number, the vendor's name, and the total amount."
-    user_prompt = st.text_area(
-        "Extraction Prompt",
-        value=default_prompt,
-        height=150,
-        help="Clearly state what information you want to extract from the invoice. Be specific for better results."
-    )
-    
-    # Advanced options
-    with st.expander("⚙️ Advanced Options"):
-        temperature = st.slider(
-            "Model Temperature", 
-            min_value=0.0, 
-            max_value=1.0, 
-            value=0.1, 
-            step=0.1,
-            help="Lower values make output more focused and deterministic"
+
+    # Batch the prompt and advanced options into a form so edits only trigger
+    # a single rerun on submit instead of one per keystroke/slider tick
+    with st.form("sidebar_form", clear_on_submit=False):
+        # Prompt input
+        default_prompt = template_prompt or "Extract the invoice number, the vendor's name, and the total amount."
+        user_prompt = st.text_area(
+            "Extraction Prompt",
+            value=default_prompt,
+            height=150,
+            help="Clearly state what information you want to extract from the invoice. Be specific for better results."
         )
-        
-        max_tokens = st.slider(
-            "Max Response Tokens",
-            min_value=256,
-            max_value=2048,
-            value=1024,
-            step=128,
-            help="Maximum length of the model's response"
+
+        # Advanced options
+        with st.expander("⚙️ Advanced Options"):
+            temperature = st.slider(
+                "Model Temperature",
+                min_value=0.0,
+                max_value=1.0,
+                value=0.1,
+                step=0.1,
+                help="Lower values make output more focused and deterministic"
+            )
+
+            max_tokens = st.slider(
+                "Max Response Tokens",
+                min_value=256,
+                max_value=2048,
+                value=1024,
+                step=128,
+                help="Maximum length of the model's response"
+            )
+
+        # Extract button
+        extract_button = st.form_submit_button(
+            "🚀 Extract Information",
+            type="primary",
+            use_container_width=True,
+            help="Click to start extracting information from the uploaded invoice"
         )
-    
-    # Extract button
-    extract_button = st.button(
-        "🚀 Extract Information", 
-        type="primary", 
-        use_container_width=True,
-        help="Click to start extracting information from the uploaded invoice"
-    )
-    
+
     return uploaded_file, user_prompt, extract_button, {"temperature": temperature, "max_tokens": max_tokens}
\ No newline at end of file
@@ -1,44 +1,78 @@
+import hashlib
+from datetime import datetime
+
 import streamlit as st
-from io import BytesIO
-from dotenv import load_dotenv
 
-from app.layout import set_page_config, display_header, display_results
-from core.parser import parse_invoice
+from app.layout import set_page_config, display_header, display_results, display_sidebar_content
+
+class _ParseFailure(Exception):
+    """Carries a failed extraction result out of the cached wrapper.
+
+    st.cache_data stores return values but not exceptions, so raising keeps
+    transient failures (timeouts, cold model, open circuit) retryable
+    instead of pinning the error dict in the cache for the full TTL.
+    """
+    def __init__(self, result):
+        super().__init__(result.get("error", "extraction failed"))
+        self.result = result
+
+@st.cache_data(show_spinner=False, max_entries=32, ttl=3600)
+def _cached_parse(pdf_digest: str, _pdf_bytes: bytes, user_prompt: str, temperature: float, max_tokens: int):
+    """Cache full extraction runs keyed on the PDF hash, prompt and model params."""
+    # Imported here so reruns that never extract skip core.parser's import
+    # graph (PDF backend, LLM client) entirely
+    from core.parser import parse_invoice
 
-load_dotenv()
+    # _pdf_bytes is underscore-prefixed so Streamlit does not hash the raw PDF
+    # bytes itself; the blake2b digest stands in as the cache key instead.
+    # temperature/max_tokens participate in the cache key so changing them
+    # forces a fresh extraction once parse_invoice supports them.
+    result = parse_invoice(pdf_file=_pdf_bytes, user_prompt=user_prompt)
+    if not result.get("success"):
+        raise _ParseFailure(result)
+    return result
 
 def main():
     set_page_config()
     display_header()
 
+    # Load .env once per session rather than re-reading it on every rerun
+    if "_env_loaded" not in st.session_state:
+        from dotenv import load_dotenv
+        load_dotenv()
+        st.session_state._env_loaded = True
+
     with st.sidebar:
-        st.header("Controls")
-        
-        uploaded_file = st.file_uploader(
-            "Upload your invoice (PDF)",
-            type="pdf",
-            accept_multiple_files=False
-        )
-
-        default_prompt = "Extract the invoice number, the vendor's name, and the total amount."
-        user_prompt = st.text_area(
-            "Prompt",
-            value=default_prompt,
-            height=150,
-            help="Clearly state what information you want to extract from the invoice."
-        )
-
-        extract_button = st.button("Extract Information", type="primary", use_container_width=True)
-
-    if "result" not in st.session_state:
-        st.session_state.result = {}
+        uploaded_file, user_prompt, extract_button, params = display_sidebar_content()
+
+    st.session_state.setdefault("result", {})
+    st.session_state.setdefault("extraction_time", "")
+
+    # Only copy the upload's bytes out of the uploader when the file actually
+    # changes, instead of re-reading the whole PDF on every rerun. file_id is
+    # unique per upload, so re-uploading a different file that shares name
+    # and size still invalidates the copy.
+    file_sig = uploaded_file.file_id if uploaded_file else None
+    if file_sig != st.session_state.get("_pdf_sig"):
+        st.session_state["_pdf_sig"] = file_sig
+        st.session_state["_pdf_bytes"] = uploaded_file.getvalue() if uploaded_file else None
 
     if extract_button:
         if uploaded_file is not None:
             with st.spinner("Processing invoice... This may take a moment."):
-                pdf_bytes = BytesIO(uploaded_file.getvalue())
-                extraction_result = parse_invoice(pdf_file=pdf_bytes, user_prompt=user_prompt)
+                pdf_bytes = st.session_state["_pdf_bytes"]
+                pdf_digest = hashlib.blake2b(pdf_bytes, digest_size=16).hexdigest()
+                try:
+                    extraction_result = _cached_parse(
+                        pdf_digest, pdf_bytes, user_prompt,
+                        params["temperature"], params["max_tokens"]
+                    )
+                except _ParseFailure as failure:
+                    # Failures are surfaced normally but never cached
+                    extraction_result = failure.result
                 st.session_state.result = extraction_result
+                # Stamped once per extraction; display_results only reads it
+                st.session_state.extraction_time = datetime.utcnow().isoformat()
         else:
             st.warning("Please upload a PDF file first.")
             st.session_state.result = {}
@@ -3,8 +3,31 @@ Pre-defined prompt templates for common invoice extraction scenarios.
 This helps users get better results with standardized prompts.
 """
 
+import re
+import sys
 from typing import Dict, List
 
+# Suggestion keywords in the priority order the old if/elif chain enforced;
+# a single alternation scan replaces ~30 sequential substring searches
+_SUGGEST_KEYWORDS = (
+    ("indian_gst", ("gst", "gstin", "indian", "india")),
+    ("eu_vat", ("vat", "european", "eu", "iban")),
+    ("us_sales_tax", ("sales tax", "us", "american", "ein")),
+    ("line_items", ("items", "products", "line items", "detailed")),
+    ("payment_terms", ("payment", "bank", "due date", "terms")),
+    ("contact_details", ("contact", "address", "phone", "email")),
+    ("financial_summary", ("tax", "financial", "money", "amount")),
+)
+_SUGGEST_PRIORITY = {
+    keyword: (priority, template)
+    for priority, (template, keywords) in enumerate(_SUGGEST_KEYWORDS)
+    for keyword in keywords
+}
+# Longest-first so e.g. "sales tax" wins over "tax" at the same position
+_SUGGEST_RE = re.compile(
+    "|".join(re.escape(kw) for kw in sorted(_SUGGEST_PRIORITY, key=len, reverse=True))
+)
+
 class PromptTemplates:
     """Collection of pre-defined prompt templates for invoice extraction."""
     
@@ -165,56 +188,62 @@ If certain information is not available, use null values."""
         }
     }
     
+    # Lazily built caches - the templates are class constants, so the
+    # category dict and the flat name->prompt index only need building once
+    _ALL_TEMPLATES = None
+    _PROMPTS_BY_NAME = None
+
     @classmethod
     def get_all_templates(cls) -> Dict[str, Dict]:
         """Get all available templates organized by category."""
-        return {
-            "Basic Templates": cls.BASIC_TEMPLATES,
-            "Regional Templates": cls.REGIONAL_TEMPLATES,
-            "Detailed Templates": cls.DETAILED_TEMPLATES,
-            "Helper Templates": cls.EXTRACTION_HELPERS
-        }
-    
+        if cls._ALL_TEMPLATES is None:
+            cls._ALL_TEMPLATES = {
+                "Basic Templates": cls.BASIC_TEMPLATES,
+                "Regional Templates": cls.REGIONAL_TEMPLATES,
+                "Detailed Templates": cls.DETAILED_TEMPLATES,
+                "Helper Templates": cls.EXTRACTION_HELPERS
+            }
+        return cls._ALL_TEMPLATES
+
+    @classmethod
+    def _prompt_index(cls) -> Dict[str, str]:
+        """Flat {template_name: prompt} index (materialized below at import)."""
+        return cls._PROMPTS_BY_NAME
+
     @classmethod
     def get_template_by_name(cls, template_name: str) -> str:
         """Get a specific template prompt by name."""
-        all_templates = cls.get_all_templates()
-        for category in all_templates.values():
-            if template_name in category:
-                return category[template_name]["prompt"]
-        return None
-    
+        return cls._prompt_index().get(template_name)
+
     @classmethod
     def get_template_names(cls) -> List[str]:
         """Get list of all template names."""
-        names = []
-        all_templates = cls.get_all_templates()
-        for category in all_templates.values():
-            names.extend(category.keys())
-        return names
+        return list(cls._prompt_index())
     
     @classmethod
     def suggest_template(cls, user_prompt: str) -> str:
         """Suggest the best template based on user's prompt."""
         user_prompt_lower = user_prompt.lower()
-        
-        # Check for specific keywords
-        if any(word in user_prompt_lower for word in ["gst", "gstin", "indian", "india"]):
-            return "indian_gst"
-        elif any(word in user_prompt_lower for word in ["vat", "european", "eu", "iban"]):
-            return "eu_vat"
-        elif any(word in user_prompt_lower for word in ["sales tax", "us", "american", "ein"]):
-            return "us_sales_tax"
-        elif any(word in user_prompt_lower for word in ["items", "products", "line items", "detailed"]):
-            return "line_items"
-        elif any(word in user_prompt_lower for word in ["payment", "bank", "due date", "terms"]):
-            return "payment_terms"
-        elif any(word in user_prompt_lower for word in ["contact", "address", "phone", "email"]):
-            return "contact_details"
-        elif any(word in user_prompt_lower for word in ["tax", "financial", "money", "amount"]):
-            return "financial_summary"
-        else:
-            return "essential_info"
+
+        # One linear scan over the prompt; the lowest-priority hit mirrors
+        # the if/elif ordering the keyword lists used to be checked in
+        best = None
+        for match in _SUGGEST_RE.finditer(user_prompt_lower):
+            priority, template = _SUGGEST_PRIORITY[match.group()]
+            if best is None or priority < best[0]:
+                best = (priority, template)
+                if priority == 0:
+                    break
+        return best[1] if best else "essential_info"
+
+# Build the flat name->prompt index eagerly - the templates are constants -
+# and intern the keys so lookups can compare by pointer instead of by value
+PromptTemplates._PROMPTS_BY_NAME = {
+    sys.intern(name): template["prompt"]
+    for category in PromptTemplates.get_all_templates().values()
+    for name, template in category.items()
+}
+
 
 def get_enhanced_prompt(base_prompt: str, invoice_type: str = "general") -> str:
     """
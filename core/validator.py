@@ -1,11 +1,137 @@
+import functools
 import re
 import json
 from typing import Dict, Any, List
 from datetime import datetime
 import logging
 
+try:
+    import numpy as np
+except ImportError:  # optional, used to vectorize batch validation
+    np = None
+
 logger = logging.getLogger(__name__)
 
+# Common tax rates checked by the amount-difference heuristic
+_COMMON_TAX_RATES = (10, 15, 18, 20, 25)
+
+# Patterns compiled once at import; the validators run per field on every
+# extraction, so skipping the re module's cache lookup each call adds up
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+_PHONE_STRIP_RE = re.compile(r'[\s\-\(\)\+]')
+_AMOUNT_STRIP_RE = re.compile(r'[^\d\.\-,]')
+_AMOUNT_STRIP_NO_COMMA_RE = re.compile(r'[^\d.-]')
+_INVOICE_RE = re.compile(r'^[a-zA-Z0-9\-_/#]+$')
+
+# Classifies the date's shape in one match so validate_date calls strptime
+# at most twice (for ambiguous day/month orderings) instead of trialling
+# nine formats via exceptions
+_DATE_CLASSIFIER = re.compile(
+    r'^(?:(?P<iso>\d{4}-\d{2}-\d{2})'
+    r'|(?P<slash>\d{1,2}/\d{1,2}/\d{4})'
+    r'|(?P<dash>\d{1,2}-\d{1,2}-\d{4})'
+    r'|(?P<dot>\d{1,2}\.\d{1,2}\.\d{4})'
+    r'|(?P<longm>[A-Za-z]+ \d{1,2}, \d{4}))$'
+)
+_DATE_FORMATS_BY_SHAPE = {
+    'iso': ('%Y-%m-%d',),
+    'slash': ('%d/%m/%Y', '%m/%d/%Y'),
+    'dash': ('%d-%m-%Y', '%m-%d-%Y'),
+    'dot': ('%d.%m.%Y',),
+    'longm': ('%B %d, %Y', '%b %d, %Y'),
+}
+# strptime is laxer than the fixed-width classifier: it accepts unpadded
+# fields and short years (e.g. '2023-1-5', '25/12/23'), so a classifier
+# miss falls back to trialling every format instead of rejecting outright
+_DATE_FORMATS_ALL = (
+    '%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%m-%d-%Y',
+    '%d.%m.%Y', '%B %d, %Y', '%b %d, %Y',
+)
+
+# Memoized cores of the pure validators: retry/self-correction loops
+# revalidate identical emails, phones and invoice numbers, so repeats
+# become a cache hit. Bounded so memory stays flat on long runs.
+@functools.lru_cache(maxsize=1024)
+def _email_is_valid(email: str) -> bool:
+    return bool(_EMAIL_RE.match(email))
+
+@functools.lru_cache(maxsize=1024)
+def _phone_is_valid(phone: str) -> bool:
+    cleaned_phone = _PHONE_STRIP_RE.sub('', phone)
+    return cleaned_phone.isdigit() and 7 <= len(cleaned_phone) <= 15
+
+@functools.lru_cache(maxsize=1024)
+def _invoice_number_is_valid(invoice_number: str) -> bool:
+    return bool(_INVOICE_RE.match(invoice_number))
+
+# Keyword alternations for categorizing amount-like keys; one compiled scan
+# per category replaces a chain of Python-level substring checks per key
+_PROMPT_AMOUNT_RE = re.compile(r'total|amount|cost')
+_AMOUNT_KEY_RE = re.compile(r'amount|total|cost|price|worth')
+_TAXABLE_KEY_RE = re.compile(r'taxable|net_worth|net_amount')
+_TOTAL_KEY_RE = re.compile(r'total|grand|final|gross_worth|gross_total')
+_TOTAL_INDICATOR_RE = re.compile(r'total|grand|final|gross')
+# All field-kind keywords fused into one classifier so validate_extraction
+# scans each field name once instead of once per branch. finditer plus the
+# priority table reproduces the old if/elif ordering (email before phone
+# before amount, ...) regardless of where the keywords sit in the name.
+_FIELD_CLASSIFIER = re.compile(
+    r'(?P<email>email)'
+    r'|(?P<phone>phone|tel)'
+    r'|(?P<amount>amount|total|price|cost|subtotal|tax|worth)'
+    r'|(?P<date>date)'
+)
+_FIELD_KIND_PRIORITY = {'email': 0, 'phone': 1, 'amount': 2, 'date': 3}
+
+@functools.lru_cache(maxsize=1024)
+def _classify_field(field_name_lower: str):
+    """Return the validation kind for a field name, or None for unclassified.
+
+    Cached because the same field names recur across invoices.
+    """
+    best_priority, kind = len(_FIELD_KIND_PRIORITY), None
+    for match in _FIELD_CLASSIFIER.finditer(field_name_lower):
+        priority = _FIELD_KIND_PRIORITY[match.lastgroup]
+        if priority < best_priority:
+            best_priority, kind = priority, match.lastgroup
+            if priority == 0:
+                break
+    if kind is None and 'invoice' in field_name_lower and 'number' in field_name_lower:
+        # Checked after the scan, not as a regex alternative: a greedy
+        # invoice.*number pattern would swallow keywords sitting between the
+        # two words. Lowest priority, exactly like the old elif chain.
+        return 'invoice_no'
+    return kind
+
+# Enhanced field mappings with better total amount detection; the underscore-
+# normalized variants used to match data keys are derived once at import
+# instead of per (field, key) pair inside validate_required_fields
+_REQUIRED_FIELD_KEYWORDS = {
+    'invoice_number': ('invoice number', 'invoice #', 'invoice id'),
+    'total_amount': ('total', 'amount', 'total amount', 'grand total', 'final total', 'total cost', 'gross total', 'gross worth'),
+    'vendor_name': ('vendor', 'supplier', 'company', 'from', 'sold by'),
+    'date': ('date', 'invoice date', 'due date'),
+    'customer_name': ('customer', 'client', 'to', 'bill to')
+}
+_REQUIRED_FIELD_KEYWORDS_NORM = {
+    field: tuple(keyword.replace(' ', '_') for keyword in keywords)
+    for field, keywords in _REQUIRED_FIELD_KEYWORDS.items()
+}
+
+# Common LLM JSON issues fused into one alternation so clean_json_string
+# scans (and reallocates) the response once instead of once per fix:
+# group 1 - trailing comma before } or ] (lookahead keeps the bracket)
+# group 2 - extra closing brace at the end
+# group 3 - stray newline between a closing quote and }
+_JSON_CLEAN_RE = re.compile(r'(,\s*(?=[}\]]))|(\}\s*\}$)|("\s*\n\s*\})')
+
+def _json_clean_repl(match):
+    if match.group(1):
+        return ''
+    if match.group(2):
+        return '}'
+    return '"}'
+
 class DataValidator:
     """Validator class for extracted invoice data."""
     
@@ -14,40 +140,45 @@ class DataValidator:
         """Validate email format."""
         if not email:
             return True  # Allow null/empty emails
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return bool(re.match(email_pattern, email))
+        return _email_is_valid(email)
     
     @staticmethod
     def validate_phone(phone: str) -> bool:
         """Validate phone number format."""
         if not phone:
             return True  # Allow null/empty phones
-        # Remove common formatting characters
-        cleaned_phone = re.sub(r'[\s\-\(\)\+]', '', str(phone))
-        # Check if it contains only digits and is reasonable length
-        return cleaned_phone.isdigit() and 7 <= len(cleaned_phone) <= 15
+        return _phone_is_valid(str(phone))
     
     @staticmethod
-    def validate_amount(amount: Any) -> bool:
-        """Validate monetary amount."""
+    def parse_amount(amount: Any) -> Any:
+        """Parse a monetary value into a float, or None when it isn't numeric.
+
+        Shared by validate_amount and validate_extraction's accuracy checks
+        so each amount field is regex-stripped and converted exactly once.
+        """
         if amount is None:
-            return True  # Allow null amounts
-        
+            return None
         try:
             # Handle string amounts with currency symbols
             if isinstance(amount, str):
                 # Remove currency symbols and whitespace
-                cleaned_amount = re.sub(r'[^\d\.\-,]', '', amount)
+                cleaned_amount = _AMOUNT_STRIP_RE.sub('', amount)
                 if not cleaned_amount:
-                    return True  # Empty string after cleaning
+                    return None  # Empty string after cleaning
                 # Replace comma with dot for decimal
-                cleaned_amount = cleaned_amount.replace(',', '.')
-                float(cleaned_amount)
-            else:
-                float(amount)
-            return True
+                return float(cleaned_amount.replace(',', '.'))
+            return float(amount)
         except (ValueError, TypeError):
-            return False
+            return None
+
+    @staticmethod
+    def validate_amount(amount: Any) -> bool:
+        """Validate monetary amount."""
+        if amount is None:
+            return True  # Allow null amounts
+        if isinstance(amount, str) and not _AMOUNT_STRIP_RE.sub('', amount):
+            return True  # Empty string after cleaning
+        return DataValidator.parse_amount(amount) is not None
     
     @staticmethod
     def validate_date(date_str: str) -> bool:
@@ -55,22 +186,19 @@ class DataValidator:
         if not date_str:
             return True  # Allow null/empty dates
         
-        # Common date formats to try
-        date_formats = [
-            '%Y-%m-%d',      # 2023-12-25
-            '%d/%m/%Y',      # 25/12/2023
-            '%m/%d/%Y',      # 12/25/2023
-            '%d-%m-%Y',      # 25-12-2023
-            '%m-%d-%Y',      # 12-25-2023
-            '%d.%m.%Y',      # 25.12.2023
-            '%B %d, %Y',     # December 25, 2023
-            '%b %d, %Y',     # Dec 25, 2023
-            '%d-%m-%Y',      # 25-01-2019
-        ]
-        
-        for fmt in date_formats:
+        date_str = str(date_str)
+        match = _DATE_CLASSIFIER.match(date_str)
+        if match:
+            # Only the formats matching the classified shape are trialled, so
+            # a valid date costs at most two strptime calls
+            formats = _DATE_FORMATS_BY_SHAPE[match.lastgroup]
+        else:
+            # Shapes the classifier doesn't recognize may still parse thanks
+            # to strptime's leniency; trial the full list as before
+            formats = _DATE_FORMATS_ALL
+        for fmt in formats:
             try:
-                datetime.strptime(str(date_str), fmt)
+                datetime.strptime(date_str, fmt)
                 return True
             except ValueError:
                 continue
@@ -83,87 +211,141 @@ class DataValidator:
             return True  # Allow null/empty invoice numbers
         
         # Basic validation - should contain alphanumeric characters
-        return bool(re.match(r'^[a-zA-Z0-9\-_/#]+$', str(invoice_number)))
+        return _invoice_number_is_valid(str(invoice_number))
     
     @staticmethod
     def validate_required_fields(data: Dict[str, Any], user_prompt: str) -> List[str]:
         """Check if commonly required fields are present based on user prompt."""
         missing_fields = []
         prompt_lower = user_prompt.lower()
-        
-        # Enhanced field mappings with better total amount detection
-        field_keywords = {
-            'invoice_number': ['invoice number', 'invoice #', 'invoice id'],
-            'total_amount': ['total', 'amount', 'total amount', 'grand total', 'final total', 'total cost', 'gross total', 'gross worth'],
-            'vendor_name': ['vendor', 'supplier', 'company', 'from', 'sold by'],
-            'date': ['date', 'invoice date', 'due date'],
-            'customer_name': ['customer', 'client', 'to', 'bill to']
-        }
-        
+
+        # Lowercase the keys once up front instead of per (field, key) pair
+        key_lowers = [key.lower() for key in data]
+
         # Check if specific fields are mentioned in prompt but missing in data
-        for field, keywords in field_keywords.items():
+        for field, keywords in _REQUIRED_FIELD_KEYWORDS.items():
             if any(keyword in prompt_lower for keyword in keywords):
                 # Look for this field in the extracted data (case insensitive)
+                keywords_norm = _REQUIRED_FIELD_KEYWORDS_NORM[field]
                 found = False
-                for key in data.keys():
-                    key_lower = key.lower()
-                    if field == 'total_amount':
-                        # Special handling for total amount - prefer final total over taxable value
-                        if any(keyword.replace(' ', '_') in key_lower for keyword in keywords):
-                            # Prioritize fields that are NOT taxable/net values
-                            if not any(avoid in key_lower for avoid in ['taxable', 'net_worth', 'net_amount']):
-                                found = True
-                                break
-                    else:
-                        if any(keyword.replace(' ', '_') in key_lower for keyword in keywords):
-                            found = True
-                            break
-                
+                for key_lower in key_lowers:
+                    if any(keyword in key_lower for keyword in keywords_norm):
+                        # Prefer final total over taxable/net values
+                        if field == 'total_amount' and _TAXABLE_KEY_RE.search(key_lower):
+                            continue
+                        found = True
+                        break
+
                 if not found:
                     missing_fields.append(field)
-        
+
         return missing_fields
 
     @staticmethod
     def validate_total_amount_accuracy(data: Dict[str, Any], user_prompt: str) -> Dict[str, Any]:
         """Validate if the extracted total amount seems correct and is truly the final total."""
+        validation_result, top_two = DataValidator._validate_total_core(data, user_prompt)
+        if top_two is not None:
+            DataValidator._append_tax_rate_hint(validation_result, *top_two)
+        return validation_result
+
+    @staticmethod
+    def validate_total_amount_accuracy_batch(records: List[Dict[str, Any]], user_prompt: str) -> List[Dict[str, Any]]:
+        """Validate the totals of many invoices at once.
+
+        The per-record categorization is unavoidable dict/string work, but
+        the common-tax-rate proximity check is evaluated across all records
+        in one vectorized numpy operation when numpy is available, instead
+        of a Python loop per invoice.
+        """
+        results = []
+        pairs = []  # (record index, highest, second highest)
+        for index, data in enumerate(records):
+            validation_result, top_two = DataValidator._validate_total_core(data, user_prompt)
+            results.append(validation_result)
+            if top_two is not None:
+                pairs.append((index, top_two[0], top_two[1]))
+
+        if not pairs:
+            return results
+
+        if np is None:
+            for index, highest, second_highest in pairs:
+                DataValidator._append_tax_rate_hint(results[index], highest, second_highest)
+            return results
+
+        amounts = np.array([[highest, second] for _, highest, second in pairs], dtype=float)
+        diff_pct = (amounts[:, 0] - amounts[:, 1]) / amounts[:, 1] * 100.0
+        near_rate = np.any(np.abs(diff_pct[:, None] - np.array(_COMMON_TAX_RATES)) < 1, axis=1)
+        for (index, highest, _), difference_percent, is_near in zip(pairs, diff_pct, near_rate):
+            if is_near:
+                results[index]["recommendations"].append(
+                    f"The amounts suggest a {difference_percent:.1f}% tax rate. "
+                    f"Ensure the higher amount ({highest}) is extracted as the total."
+                )
+        return results
+
+    @staticmethod
+    def _append_tax_rate_hint(validation_result: Dict[str, Any], highest: float, second_highest: float) -> None:
+        """Flag amount pairs whose difference matches a common tax rate."""
+        difference_percent = ((highest - second_highest) / second_highest) * 100
+
+        if any(abs(difference_percent - rate) < 1 for rate in _COMMON_TAX_RATES):
+            validation_result["recommendations"].append(
+                f"The amounts suggest a {difference_percent:.1f}% tax rate. "
+                f"Ensure the higher amount ({highest}) is extracted as the total."
+            )
+
+    @staticmethod
+    def _validate_total_core(data: Dict[str, Any], user_prompt: str):
+        """Categorize amount fields and run the total checks.
+
+        Returns the validation result plus the (highest, second highest)
+        amounts when at least two were found, so callers can run the
+        tax-rate heuristic scalar or batched.
+        """
         validation_result = {"valid": True, "warnings": [], "recommendations": []}
         
         prompt_lower = user_prompt.lower()
-        if not any(term in prompt_lower for term in ['total', 'amount', 'cost']):
-            return validation_result
-        
-        # Categorize amount fields
-        total_fields = {}
-        taxable_fields = {}
-        other_amount_fields = {}
+        if not _PROMPT_AMOUNT_RE.search(prompt_lower):
+            return validation_result, None
         
+        # One pass over the data: running maxima per category plus a top-2
+        # over all amounts, instead of three intermediate dicts, two max()
+        # passes and a merge-and-sort afterwards
+        max_total = max_taxable = None
+        amount_count = 0
+        highest = second_highest = None
+
         for key, value in data.items():
             key_lower = key.lower()
-            if any(term in key_lower for term in ['amount', 'total', 'cost', 'price', 'worth']):
-                try:
-                    # Convert to float for comparison
-                    if isinstance(value, str):
-                        numeric_value = float(re.sub(r'[^\d.-]', '', value))
-                    else:
-                        numeric_value = float(value)
-                    
-                    # Categorize the field
-                    if any(term in key_lower for term in ['taxable', 'net_worth', 'net_amount']):
-                        taxable_fields[key] = numeric_value
-                    elif any(term in key_lower for term in ['total', 'grand', 'final', 'gross_worth', 'gross_total']):
-                        total_fields[key] = numeric_value
-                    else:
-                        other_amount_fields[key] = numeric_value
-                        
-                except (ValueError, TypeError):
-                    continue
-        
+            if not _AMOUNT_KEY_RE.search(key_lower):
+                continue
+            try:
+                # Convert to float for comparison
+                if isinstance(value, str):
+                    numeric_value = float(_AMOUNT_STRIP_NO_COMMA_RE.sub('', value))
+                else:
+                    numeric_value = float(value)
+            except (ValueError, TypeError):
+                continue
+
+            # Categorize the field
+            if _TAXABLE_KEY_RE.search(key_lower):
+                if max_taxable is None or numeric_value > max_taxable:
+                    max_taxable = numeric_value
+            elif _TOTAL_KEY_RE.search(key_lower):
+                if max_total is None or numeric_value > max_total:
+                    max_total = numeric_value
+
+            amount_count += 1
+            if highest is None or numeric_value > highest:
+                highest, second_highest = numeric_value, highest
+            elif second_highest is None or numeric_value > second_highest:
+                second_highest = numeric_value
+
         # Check if we have the right total
-        if total_fields and taxable_fields:
-            max_total = max(total_fields.values())
-            max_taxable = max(taxable_fields.values())
-            
+        if max_total is not None and max_taxable is not None:
             # The total should be higher than or equal to taxable value
             if max_taxable > max_total:
                 validation_result["warnings"].append(
@@ -182,7 +364,7 @@ class DataValidator:
                 )
         
         # If only one type of amount field exists, provide guidance
-        elif taxable_fields and not total_fields:
+        elif max_taxable is not None and max_total is None:
             validation_result["warnings"].append(
                 "Only taxable/net amounts found. The final total (including taxes) may be missing."
             )
@@ -190,28 +372,12 @@ class DataValidator:
                 "Look for 'Gross Total', 'Grand Total', or 'Final Amount' which includes all taxes."
             )
         
-        # Check for suspicious amounts (common error patterns)
-        all_amounts = {**total_fields, **taxable_fields, **other_amount_fields}
-        if len(all_amounts) > 1:
-            amounts_list = list(all_amounts.values())
-            amounts_list.sort(reverse=True)
-            
-            # If the difference between highest and second highest is exactly 10% or common tax rates
-            if len(amounts_list) >= 2:
-                highest = amounts_list[0]
-                second_highest = amounts_list[1]
-                difference_percent = ((highest - second_highest) / second_highest) * 100
-                
-                # Common tax rates: 10%, 15%, 18%, 20%, 25%
-                common_tax_rates = [10, 15, 18, 20, 25]
-                
-                if any(abs(difference_percent - rate) < 1 for rate in common_tax_rates):
-                    validation_result["recommendations"].append(
-                        f"The amounts suggest a {difference_percent:.1f}% tax rate. "
-                        f"Ensure the higher amount ({highest}) is extracted as the total."
-                    )
-        
-        return validation_result
+        # Check for suspicious amounts (common error patterns): hand back the
+        # two highest amounts so the tax-rate heuristic can run on them
+        if amount_count > 1:
+            return validation_result, (highest, second_highest)
+
+        return validation_result, None
 
 
 def validate_extraction(extracted_data: Dict[str, Any], user_prompt: str) -> Dict[str, Any]:
@@ -238,7 +404,11 @@ def validate_extraction(extracted_data: Dict[str, Any], user_prompt: str) -> Dic
         validation_results["recommendations"].extend(total_validation.get("recommendations", []))
         if not total_validation["valid"]:
             validation_results["is_valid"] = False
-        
+
+        # Hoisted out of the field loop: the prompt doesn't change per field
+        prompt_lower = user_prompt.lower()
+        wants_total = 'total' in prompt_lower
+
         # Validate individual fields
         for field_name, field_value in extracted_data.items():
             field_validation = {"valid": True, "message": ""}
@@ -250,58 +420,54 @@ def validate_extraction(extracted_data: Dict[str, Any], user_prompt: str) -> Dic
                 continue
             
             field_name_lower = field_name.lower()
-            
+            field_kind = _classify_field(field_name_lower)
+
             # Email validation
-            if 'email' in field_name_lower:
+            if field_kind == 'email':
                 if not validator.validate_email(field_value):
                     field_validation["valid"] = False
                     field_validation["message"] = "Invalid email format"
                     validation_results["errors"].append(f"Invalid email format for {field_name}")
             
             # Phone validation
-            elif 'phone' in field_name_lower or 'tel' in field_name_lower:
+            elif field_kind == 'phone':
                 if not validator.validate_phone(field_value):
                     field_validation["valid"] = False
                     field_validation["message"] = "Invalid phone format"
                     validation_results["warnings"].append(f"Questionable phone format for {field_name}")
             
             # Amount validation with enhanced total amount checking
-            elif any(keyword in field_name_lower for keyword in ['amount', 'total', 'price', 'cost', 'subtotal', 'tax', 'worth']):
-                if not validator.validate_amount(field_value):
+            elif field_kind == 'amount':
+                # Parse once; the float is reused for the accuracy checks
+                numeric_value = validator.parse_amount(field_value)
+                if numeric_value is None and not validator.validate_amount(field_value):
                     field_validation["valid"] = False
                     field_validation["message"] = "Invalid amount format"
                     validation_results["errors"].append(f"Invalid amount format for {field_name}")
-                else:
-                    # Enhanced check for total amount accuracy
-                    try:
-                        numeric_value = float(field_value) if isinstance(field_value, (int, float)) else float(re.sub(r'[^\d.-]', '', str(field_value)))
-                        
-                        # Enhanced warning for total amount requests
-                        if any(term in user_prompt.lower() for term in ['total', 'total amount', 'total cost']):
-                            # Check if this looks like a pre-tax amount when user asked for total
-                            if any(pre_tax_indicator in field_name_lower for pre_tax_indicator in ['taxable', 'net_worth', 'net_amount']):
-                                validation_results["errors"].append(
-                                    f"CRITICAL ERROR: '{field_name}' appears to be a pre-tax amount (${numeric_value}), "
-                                    f"but user requested total amount. Look for 'Gross Total' or 'Grand Total' instead."
-                                )
-                                validation_results["is_valid"] = False
-                            
-                            # Check if this is the right type of total
-                            elif any(total_indicator in field_name_lower for total_indicator in ['total', 'grand', 'final', 'gross']):
-                                field_validation["message"] = f"Correctly identified as final total: ${numeric_value}"
-                        
-                    except (ValueError, TypeError):
-                        pass
+                elif numeric_value is not None:
+                    # Enhanced warning for total amount requests
+                    if wants_total:
+                        # Check if this looks like a pre-tax amount when user asked for total
+                        if _TAXABLE_KEY_RE.search(field_name_lower):
+                            validation_results["errors"].append(
+                                f"CRITICAL ERROR: '{field_name}' appears to be a pre-tax amount (${numeric_value}), "
+                                f"but user requested total amount. Look for 'Gross Total' or 'Grand Total' instead."
+                            )
+                            validation_results["is_valid"] = False
+
+                        # Check if this is the right type of total
+                        elif _TOTAL_INDICATOR_RE.search(field_name_lower):
+                            field_validation["message"] = f"Correctly identified as final total: ${numeric_value}"
             
             # Date validation
-            elif 'date' in field_name_lower:
+            elif field_kind == 'date':
                 if not validator.validate_date(field_value):
                     field_validation["valid"] = False
                     field_validation["message"] = "Invalid date format"
                     validation_results["warnings"].append(f"Questionable date format for {field_name}")
             
             # Invoice number validation
-            elif 'invoice' in field_name_lower and 'number' in field_name_lower:
+            elif field_kind == 'invoice_no':
                 if not validator.validate_invoice_number(field_value):
                     field_validation["valid"] = False
                     field_validation["message"] = "Invalid invoice number format"
@@ -337,6 +503,25 @@ def validate_extraction(extracted_data: Dict[str, Any], user_prompt: str) -> Dic
     return validation_results
 
 
+# Enhanced field mappings with priority for final totals over taxable values,
+# inverted at import into alias -> (standard_field, priority) for O(1) lookups
+_FIELD_MAPPINGS = {
+    "invoice_number": ["Invoice Number", "invoice_number", "InvoiceNumber"],
+    "date": ["Date of Issue", "date", "Date", "invoice_date"],
+    "seller": ["Seller", "seller", "vendor", "from"],
+    "client": ["Client", "client", "customer", "to"],
+    # CRITICAL: Prioritize final total over taxable value
+    "total": ["gross_total", "gross_worth", "final_total", "grand_total", "total", "Total", "amount_due"],
+    "taxable_value": ["taxable_value", "taxable_amount", "net_worth", "net_amount"],
+    "items": ["Items", "items", "line_items"]
+}
+_ALIAS_INDEX = {
+    alias: (standard_field, priority)
+    for standard_field, aliases in _FIELD_MAPPINGS.items()
+    for priority, alias in enumerate(aliases)
+}
+
+
 def validate_json_response(data: Dict[str, Any]) -> Dict[str, Any]:
     """Validate and clean JSON response from LLM with improved total amount handling."""
     if not isinstance(data, dict):
@@ -348,49 +533,50 @@ def validate_json_response(data: Dict[str, Any]) -> Dict[str, Any]:
         return data
     
     validated_data = {}
-    
-    # Enhanced field mappings with priority for final totals over taxable values
-    field_mappings = {
-        "invoice_number": ["Invoice Number", "invoice_number", "InvoiceNumber"],
-        "date": ["Date of Issue", "date", "Date", "invoice_date"],
-        "seller": ["Seller", "seller", "vendor", "from"],
-        "client": ["Client", "client", "customer", "to"],
-        # CRITICAL: Prioritize final total over taxable value
-        "total": ["gross_total", "gross_worth", "final_total", "grand_total", "total", "Total", "amount_due"],
-        "taxable_value": ["taxable_value", "taxable_amount", "net_worth", "net_amount"],
-        "items": ["Items", "items", "line_items"]
-    }
-    
-    # Extract fields using flexible field names with priority
-    for standard_field, possible_names in field_mappings.items():
-        for field_name in possible_names:
-            if field_name in data:
-                validated_data[standard_field] = data[field_name]
-                break
+
+    # Map aliases in one pass over the response instead of probing the data
+    # dict once per alias; lower priority number wins, mirroring the order
+    # the alias lists used to be probed in
+    best_priority = {}
+    for key, value in data.items():
+        hit = _ALIAS_INDEX.get(key)
+        if hit is None:
+            continue
+        standard_field, priority = hit
+        if priority < best_priority.get(standard_field, len(_ALIAS_INDEX)):
+            best_priority[standard_field] = priority
+            validated_data[standard_field] = value
     
     # ENHANCED: Special handling to ensure we get the RIGHT total (not taxable value)
     if "total" not in validated_data:
-        # Look for any field that might be the FINAL total amount (highest priority)
-        total_candidates = {}
-        
+        # Track the best candidate inline instead of building a dict of all
+        # candidates and min()-ing over it afterwards
+        best_priority, best_key, best_value = 4, None, None
+
         for key, value in data.items():
             key_lower = key.lower()
-            
-            # Prioritize fields that indicate final total
-            if any(term in key_lower for term in ['gross_total', 'gross_worth', 'final_total', 'grand_total']):
-                total_candidates[key] = {"value": value, "priority": 1}
-            elif any(term in key_lower for term in ['total', 'amount_due']) and \
-                 not any(avoid in key_lower for avoid in ['taxable', 'net_worth', 'net_amount', 'subtotal']):
-                total_candidates[key] = {"value": value, "priority": 2}
-            elif any(term in key_lower for term in ['amount']) and \
-                 not any(avoid in key_lower for avoid in ['taxable', 'net_', 'subtotal']):
-                total_candidates[key] = {"value": value, "priority": 3}
-        
-        # Select the highest priority total
-        if total_candidates:
-            best_candidate = min(total_candidates.items(), key=lambda x: x[1]["priority"])
-            validated_data["total"] = best_candidate[1]["value"]
-            logger.info(f"Selected '{best_candidate[0]}' as total amount with priority {best_candidate[1]['priority']}")
+
+            # Prioritize fields that indicate final total; inlined boolean
+            # chains skip the generator frame any() would allocate per key
+            if ('gross_total' in key_lower or 'gross_worth' in key_lower
+                    or 'final_total' in key_lower or 'grand_total' in key_lower):
+                priority = 1
+            elif (('total' in key_lower or 'amount_due' in key_lower)
+                    and 'taxable' not in key_lower and 'net_worth' not in key_lower
+                    and 'net_amount' not in key_lower and 'subtotal' not in key_lower):
+                priority = 2
+            elif ('amount' in key_lower and 'taxable' not in key_lower
+                    and 'net_' not in key_lower and 'subtotal' not in key_lower):
+                priority = 3
+            else:
+                continue
+
+            if priority < best_priority:
+                best_priority, best_key, best_value = priority, key, value
+
+        if best_key is not None:
+            validated_data["total"] = best_value
+            logger.info(f"Selected '{best_key}' as total amount with priority {best_priority}")
     
     # Validate items if present
     if "items" in validated_data and isinstance(validated_data["items"], list):
@@ -403,30 +589,28 @@ def validate_json_response(data: Dict[str, Any]) -> Dict[str, Any]:
     return validated_data
 
 
-def is_valid_json_string(json_string: str) -> bool:
-    """Check if a string is valid JSON."""
+@functools.lru_cache(maxsize=512)
+def _is_valid_json_cached(json_string: str) -> bool:
     try:
         json.loads(json_string)
         return True
-    except (json.JSONDecodeError, TypeError):
+    except json.JSONDecodeError:
+        return False
+
+
+def is_valid_json_string(json_string: str) -> bool:
+    """Check if a string is valid JSON.
+
+    Parses are memoized: retry loops re-check the same multi-KB LLM
+    response, and json.loads is by far the expensive part.
+    """
+    if not isinstance(json_string, str):
         return False
+    return _is_valid_json_cached(json_string)
 
 
 
 
 def clean_json_string(json_string: str) -> str:
     """Clean and fix common JSON string issues."""
-    cleaned = json_string.strip()
-    
-    # Fix common LLM JSON issues
-    fixes = [
-        (r',\s*}', '}'),          # Remove trailing commas before }
-        (r',\s*]', ']'),          # Remove trailing commas before ]
-        (r'}\s*}$', '}'),         # Remove extra closing braces
-        (r'"\s*\n\s*}', '"}'),    # Fix missing quotes
-    ]
-    
-    for pattern, replacement in fixes:
-        cleaned = re.sub(pattern, replacement, cleaned)
-    
-    return cleaned
\ No newline at end of file
+    return _JSON_CLEAN_RE.sub(_json_clean_repl, json_string.strip())
\ No newline at end of file
@@ -1,90 +1,631 @@
-import os
-import json
-import requests
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-class LlamaModel:
-    """
-    A class to interact with the LLaMA 2 model via the Hugging Face Inference API.
-    This avoids loading the model locally, saving significant system resources.
-    """
-    def __init__(self, model_name: str = "meta-llama/Llama-2-7b-chat-hf"):
-        """
-        Initializes the API client for the specified LLaMA 2 model.
-        
-        Args:
-            model_name (str): The identifier for the model on Hugging Face Hub.
-        """
-        self.api_url = f"https://api-inference.huggingface.co/models/{model_name}"
-        self.api_token = os.getenv("HUGGING_FACE_TOKEN")
-        
-        if not self.api_token:
-            raise ValueError("HUGGING_FACE_TOKEN is not set in the .env file.")
-            
-        self.headers = {"Authorization": f"Bearer {self.api_token}"}
-        print(f"API client initialized for model: {model_name}")
-
-    def run(self, prompt: str) -> str:
-        """
-        Sends a prompt to the Inference API and gets a response.
-        
-        Args:
-            prompt (str): The input prompt for the model.
-            
-        Returns:
-            str: The model's generated response (hopefully a JSON string).
-        """
-        print("\n--- Sending Prompt to LLaMA 2 Inference API ---")
-        
-        # The API expects a JSON payload with the 'inputs' key
-        payload = {
-            "inputs": prompt,
-            "parameters": {
-                "max_new_tokens": 512,
-                "return_full_text": False, # Important to get only the generated part
-            }
-        }
-        
-        response = None # Initialize response to None
-        try:
-            response = requests.post(self.api_url, headers=self.headers, json=payload, timeout=90)
-            response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-            
-            api_response = response.json()
-            print("--- Raw API Response ---")
-            print(api_response)
-
-            # Extract the generated text
-            generated_text = api_response[0].get("generated_text", "")
-            
-            # Find and return the clean JSON part
-            json_start_index = generated_text.find('{')
-            if json_start_index != -1:
-                json_end_index = generated_text.rfind('}')
-                if json_end_index != -1:
-                    clean_response = generated_text[json_start_index : json_end_index + 1]
-                    print("\n--- Cleaned JSON Response ---")
-                    print(clean_response)
-                    return clean_response
-            
-            return '{"error": "Could not extract a valid JSON object from the API response."}'
-
-        except requests.exceptions.RequestException as e:
-            print(f"--- Error calling Inference API ---")
-            print(f"Exception Type: {type(e)}")
-            print(f"Error Message: {e}")
-            
-            if response is not None:
-                print(f"Response Status Code: {response.status_code}")
-                print(f"Response Text: {response.text}")
-                error_details = response.text.replace('"', '\\"')
-            else:
-                error_details = "No response from server. Check network connection/firewall."
-
-            return f'{{"error": "API request failed.", "details": "{error_details}"}}'
-
-# Create a single instance to be imported elsewhere
-llm_model = LlamaModel()
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import json
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+try:
+    import orjson
+except ImportError:  # optional speedup, stdlib json is the fallback
+    orjson = None
+
+from models import llm_cache
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Input token budget: prefill latency and uplink bandwidth scale with prompt
+# length, and OCR'd invoices can run tens of KB of mostly boilerplate
+_MAX_INPUT_TOKENS = 2048
+# Rough chars-per-token estimate for the fallback when no tokenizer is
+# installed; deliberately generous so the fallback never over-trims
+_FALLBACK_CHARS_PER_TOKEN = 4
+
+# Circuit breaker thresholds: after this many consecutive API failures,
+# calls fail fast for the cooldown period instead of each blocking for the
+# full request timeout against a cold or unavailable backend
+_CB_FAIL_MAX = 3
+_CB_RESET_TIMEOUT = 30.0
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised when the circuit breaker is open and API calls fail fast."""
+
+def _loads(data):
+    """Parse JSON from bytes/str, using orjson's C parser when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _decode_response(response):
+    """Decode a JSON response body, using orjson's C parser when available."""
+    return _loads(response.content)
+
+def _feedback_prompt(prompt: str, bad_output: str) -> str:
+    """Build the retry prompt that feeds an invalid output back to the model."""
+    return (
+        f"{prompt}\n\nYour previous output was invalid JSON: "
+        f"{bad_output[:200]}. Output ONLY the JSON object."
+    )
+
+def _read_json_body(response, chunk_size=4096):
+    """Read only the first balanced JSON value from a streaming response.
+
+    Tracks bracket depth and string-literal state across chunks and closes
+    the connection as soon as the top-level value is complete, so any bytes
+    the server appends after the JSON (gateway metadata, trailing newlines)
+    are never pulled off the wire and parsing can start while the tail of a
+    long body would still be in flight.
+    """
+    chunks = []
+    depth = 0
+    in_string = False
+    escaped = False
+    started = False
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        for index, byte in enumerate(chunk):
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif byte == 0x5C:  # backslash
+                    escaped = True
+                elif byte == 0x22:  # double quote
+                    in_string = False
+            elif byte == 0x22:
+                in_string = True
+            elif byte in (0x7B, 0x5B):  # { or [
+                depth += 1
+                started = True
+            elif byte in (0x7D, 0x5D):  # } or ]
+                depth -= 1
+                if started and depth == 0:
+                    chunks.append(chunk[:index + 1])
+                    response.close()
+                    return b"".join(chunks)
+        chunks.append(chunk)
+    response.close()
+    return b"".join(chunks)
+
+def _extract_json_object(text: str):
+    """Return the first balanced JSON object in text, or None.
+
+    Walks the string once tracking brace depth and string-literal state.
+    Unlike the old find('{')/rfind('}') slice, prose the model appends after
+    the JSON cannot drag a stray closing brace into the extraction, and the
+    text is scanned once instead of twice.
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    return None
+
+class LlamaModel:
+    """
+    A class to interact with the LLaMA 2 model via the Hugging Face Inference API.
+    This avoids loading the model locally, saving significant system resources.
+    """
+    def __init__(self, model_name: str = "meta-llama/Llama-2-7b-chat-hf",
+                 cache_dir: str = None, prompt_version: str = "v1"):
+        """
+        Initializes the API client for the specified LLaMA 2 model.
+
+        Args:
+            model_name (str): The identifier for the model on Hugging Face Hub.
+            cache_dir (str, optional): Directory for the persistent response
+                cache; defaults to the shared data/llm_cache directory.
+            prompt_version (str): Version tag mixed into cache keys so bumping
+                it invalidates entries produced by older prompt formats.
+        """
+        self.model_name = model_name
+        self.api_url = f"https://api-inference.huggingface.co/models/{model_name}"
+        self.api_token = os.getenv("HUGGING_FACE_TOKEN")
+        self.cache_dir = cache_dir or llm_cache.DEFAULT_CACHE_DIR
+        self.prompt_version = prompt_version
+        
+        if not self.api_token:
+            raise ValueError("HUGGING_FACE_TOKEN is not set in the .env file.")
+            
+        self.headers = {"Authorization": f"Bearer {self.api_token}"}
+
+        # Constant generation parameters, built once instead of per request.
+        # Callers that add per-request keys (e.g. a grammar) must copy first.
+        self._params = {
+            "max_new_tokens": 512,
+            "return_full_text": False,  # Important to get only the generated part
+            "truncate": _MAX_INPUT_TOKENS,  # server-side safety net for the budget
+        }
+        # Loaded lazily by _get_tokenizer; False marks a failed load so the
+        # (potentially slow) download is only attempted once
+        self._tokenizer = None
+
+        # Circuit breaker state: consecutive failure count and the monotonic
+        # deadline before which calls fail fast (0 = circuit closed)
+        self._cb_failures = 0
+        self._cb_open_until = 0.0
+
+        # One pooled session for the process: HTTP keep-alive skips the
+        # TCP+TLS handshake on every call, and the mounted retry policy
+        # absorbs the API's transient 429/5xx (notably the 503 "model is
+        # loading" responses) with exponential backoff
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=32,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=1,
+                status_forcelist=[429, 502, 503, 504],
+                allowed_methods=["POST"],
+            ),
+        ))
+        logger.debug("API client initialized for model: %s", model_name)
+
+    def _record_failure(self):
+        """Count a failed API call and open the circuit at the threshold.
+
+        The counter is deliberately not reset when the circuit opens: once
+        the cooldown expires, a single failed trial call re-opens the
+        circuit immediately (half-open behaviour), while a success in
+        _post_json resets everything.
+        """
+        self._cb_failures += 1
+        if self._cb_failures >= _CB_FAIL_MAX:
+            self._cb_open_until = time.monotonic() + _CB_RESET_TIMEOUT
+            logger.warning(
+                "Circuit breaker open for %.0f s after %d consecutive API failures",
+                _CB_RESET_TIMEOUT, self._cb_failures,
+            )
+
+    def _post_json(self, payload, timeout=90, stream=False):
+        """POST a JSON payload, encoding with orjson when available.
+
+        orjson returns bytes, which requests accepts directly as the body;
+        the Content-Type header replaces what json= would have set.
+
+        All API calls funnel through here, so this is also where the
+        circuit breaker lives: once the backend has failed repeatedly
+        (e.g. a cold model returning 503s past the adapter's retries),
+        callers fail fast instead of each blocking for the full timeout.
+        """
+        if time.monotonic() < self._cb_open_until:
+            raise CircuitOpenError(
+                "Inference API circuit breaker is open; failing fast during cooldown."
+            )
+
+        try:
+            if orjson is not None:
+                response = self.session.post(
+                    self.api_url,
+                    data=orjson.dumps(payload),
+                    headers={"Content-Type": "application/json"},
+                    timeout=timeout,
+                    stream=stream,
+                )
+            else:
+                response = self.session.post(self.api_url, json=payload, timeout=timeout, stream=stream)
+        except requests.exceptions.RequestException:
+            self._record_failure()
+            raise
+
+        if response.status_code >= 500:
+            self._record_failure()
+        else:
+            self._cb_failures = 0
+            self._cb_open_until = 0.0
+        return response
+
+    def _get_tokenizer(self):
+        """Load the model's tokenizer on first use, or None if unavailable.
+
+        tokenizers is an optional dependency (it ships with transformers,
+        already in requirements); loading can also fail offline, so any
+        failure downgrades to the character-budget fallback.
+        """
+        if self._tokenizer is None:
+            try:
+                from tokenizers import Tokenizer
+                self._tokenizer = Tokenizer.from_pretrained(self.model_name)
+            except Exception as error:
+                logger.warning("Could not load tokenizer for %s: %s", self.model_name, error)
+                self._tokenizer = False
+        return self._tokenizer or None
+
+    def _truncate_prompt(self, prompt: str) -> str:
+        """Trim the prompt to the input token budget before sending.
+
+        Prefill time is O(input tokens), so anything past the budget only
+        adds latency and cost. Uses the model's real tokenizer when it can
+        be loaded, otherwise a conservative character budget. Truncating
+        client-side also improves cache hit rates: oversized prompts that
+        share a prefix collapse to the same cache key.
+        """
+        # A token is at least one character, so short prompts skip tokenizing
+        if len(prompt) <= _MAX_INPUT_TOKENS:
+            return prompt
+
+        tokenizer = self._get_tokenizer()
+        if tokenizer is not None:
+            ids = tokenizer.encode(prompt).ids
+            if len(ids) <= _MAX_INPUT_TOKENS:
+                return prompt
+            logger.warning("Truncating prompt from %d to %d tokens", len(ids), _MAX_INPUT_TOKENS)
+            return tokenizer.decode(ids[:_MAX_INPUT_TOKENS])
+
+        char_budget = _MAX_INPUT_TOKENS * _FALLBACK_CHARS_PER_TOKEN
+        if len(prompt) > char_budget:
+            logger.warning(
+                "Truncating prompt from %d to %d chars (no tokenizer available)",
+                len(prompt), char_budget,
+            )
+            return prompt[:char_budget]
+        return prompt
+
+    def _cache_key(self, prompt: str) -> str:
+        """Persistent-cache key for a prompt, scoped by model and prompt version."""
+        return hashlib.sha256(
+            f"{self.model_name}|{self.prompt_version}|{prompt}".encode()
+        ).hexdigest()
+
+    def _cache_if_valid(self, cache_key: str, generated_text: str):
+        """Extract and validate the JSON object in a model output.
+
+        Returns the clean JSON string after storing it in the persistent
+        cache, or None when the text holds no well-formed JSON object -
+        failures are never cached so the next call retries. Shared by the
+        streaming and non-streaming paths so both populate the same cache.
+        """
+        clean_response = _extract_json_object(generated_text)
+        if clean_response is None:
+            return None
+        try:
+            _loads(clean_response)
+        except ValueError:
+            return None
+        llm_cache.set(cache_key, clean_response, self.cache_dir)
+        return clean_response
+
+    def warmup(self):
+        """
+        Fires a tiny throwaway request to trigger the hosted model's load.
+
+        The Inference API spins models down when idle, so the first real
+        request otherwise eats the full cold-start wait. Failures are
+        swallowed: warmup is best-effort and the real request will retry.
+        """
+        payload = {
+            "inputs": "{}",
+            "parameters": {"max_new_tokens": 1, "return_full_text": False},
+            "options": {"wait_for_model": False},
+        }
+        try:
+            self._post_json(payload, timeout=10)
+            logger.debug("Warmup request sent to Inference API.")
+        except requests.exceptions.RequestException:
+            pass
+
+    def run(self, prompt: str, json_schema: dict = None) -> str:
+        """
+        Sends a prompt to the Inference API and gets a response.
+
+        Args:
+            prompt (str): The input prompt for the model.
+            json_schema (dict, optional): JSON schema for guided decoding.
+                Backends that support grammars (e.g. TGI) are forced to emit
+                JSON matching the schema instead of free-form text.
+
+        Returns:
+            str: The model's generated response (hopefully a JSON string).
+        """
+        # Truncate before hashing so oversized prompts sharing a prefix
+        # collapse onto one cache entry
+        prompt = self._truncate_prompt(prompt)
+
+        # Identical prompts hit the persistent cache instead of the network
+        cache_key = self._cache_key(prompt)
+        cached = llm_cache.get(cache_key, self.cache_dir)
+        if cached is not None:
+            return cached
+
+        logger.debug("Sending prompt to LLaMA 2 Inference API")
+
+        # Invalid JSON from the model is common enough to be worth a couple
+        # of feedback retries: the failed output is echoed back with a
+        # reminder to emit only JSON, which usually fixes it on attempt two
+        attempt_prompt = prompt
+        response = None # Initialize response to None
+        for attempt in range(3):
+            # The API expects a JSON payload with the 'inputs' key
+            payload = {"inputs": attempt_prompt, "parameters": self._params}
+            if json_schema is not None:
+                payload["parameters"] = dict(self._params, grammar={"type": "json", "value": json_schema})
+
+            try:
+                response = self._post_json(payload, stream=True)
+                response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
+
+                # Stream the body and stop reading at the end of the JSON value
+                api_response = _loads(_read_json_body(response))
+                # Dumping the full response serializes kilobytes; skip it
+                # entirely unless debug logging is actually on
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Raw API response: %s", api_response)
+
+                # Extract the generated text
+                generated_text = api_response[0].get("generated_text", "")
+            except (requests.exceptions.RequestException, ValueError) as e:
+                # Transport-level retries already happened in the adapter;
+                # feedback retries only help with malformed model output.
+                # ValueError covers a 2xx body that isn't JSON: unlike
+                # response.json(), _loads raises the plain decode error,
+                # which is not a RequestException
+                return self._handle_request_error(e, response)
+
+            # Find and return the clean JSON part; only well-formed JSON is
+            # returned and cached, garbled output falls through to the
+            # feedback retry below
+            clean_response = self._cache_if_valid(cache_key, generated_text)
+            if clean_response is not None:
+                logger.debug("Cleaned JSON response: %s", clean_response)
+                return clean_response
+
+            if attempt < 2:
+                attempt_prompt = _feedback_prompt(prompt, generated_text)
+                logger.warning(
+                    "Model output was not valid JSON (attempt %d); retrying with feedback",
+                    attempt + 1,
+                )
+                time.sleep(1.0 * (attempt + 1))
+
+        return '{"error": "Could not extract a valid JSON object from the API response."}'
+
+    def run_batch(self, prompts, json_schema: dict = None) -> list:
+        """
+        Sends several prompts to the Inference API in a single request.
+
+        The API accepts a list under 'inputs', letting the server batch the
+        generations and share KV cache across common prompt prefixes; one
+        HTTP round-trip replaces len(prompts) separate calls. Falls back to
+        sequential run() calls if the batched request fails.
+
+        Gets the same reliability treatment as run(): each prompt is checked
+        against the persistent cache first (only misses go in the batched
+        request), validated outputs are stored back, and items without a
+        valid JSON object get the feedback retry via run().
+
+        Returns:
+            list: Responses in the same order as the prompts.
+        """
+        prompts = [self._truncate_prompt(prompt) for prompt in prompts]
+        if not prompts:
+            return []
+
+        # Per-prompt cache pass; only misses pay for inference
+        results = [None] * len(prompts)
+        cache_keys = [self._cache_key(prompt) for prompt in prompts]
+        pending = []
+        for idx, cache_key in enumerate(cache_keys):
+            cached = llm_cache.get(cache_key, self.cache_dir)
+            if cached is not None:
+                results[idx] = cached
+            else:
+                pending.append(idx)
+        if not pending:
+            return results
+
+        payload = {"inputs": [prompts[idx] for idx in pending], "parameters": self._params}
+        if json_schema is not None:
+            payload["parameters"] = dict(self._params, grammar={"type": "json", "value": json_schema})
+
+        try:
+            response = self._post_json(payload)
+            response.raise_for_status()
+            api_response = _decode_response(response)
+        except (requests.exceptions.RequestException, ValueError):
+            # Batched inputs unsupported, unavailable or returning a
+            # non-JSON body; degrade gracefully to sequential calls
+            for idx in pending:
+                results[idx] = self.run(prompts[idx], json_schema=json_schema)
+            return results
+
+        for idx, item in zip(pending, api_response):
+            if isinstance(item, list):
+                item = item[0] if item else {}
+            generated_text = item.get("generated_text", "") if isinstance(item, dict) else ""
+
+            # Validate-and-store like run(); invalid output gets run()'s
+            # feedback retry instead of an immediate error sentinel
+            clean_response = self._cache_if_valid(cache_keys[idx], generated_text)
+            if clean_response is None:
+                clean_response = self.run(
+                    _feedback_prompt(prompts[idx], generated_text) if generated_text else prompts[idx],
+                    json_schema=json_schema,
+                )
+            results[idx] = clean_response
+
+        # A short server response leaves trailing prompts unanswered; run
+        # them individually rather than returning None slots
+        for idx in pending:
+            if results[idx] is None:
+                results[idx] = self.run(prompts[idx], json_schema=json_schema)
+        return results
+
+    async def arun(self, prompt: str, json_schema: dict = None) -> str:
+        """
+        Async counterpart of run().
+
+        The blocking HTTP call is handed to the event loop's default
+        executor, so callers can keep many invoices in flight at once and
+        let the Inference API batch them server-side. The work is purely
+        network-bound, which is exactly what executor threads are for.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, lambda: self.run(prompt, json_schema=json_schema)
+        )
+
+    async def arun_many(self, prompts, json_schema: dict = None) -> list:
+        """
+        Runs several prompts concurrently and returns responses in order.
+
+        Wall time for N prompts collapses from N x latency to roughly the
+        latency of the slowest request, up to the executor's thread limit.
+        """
+        return await asyncio.gather(
+            *(self.arun(prompt, json_schema=json_schema) for prompt in prompts)
+        )
+
+    def stream_response(self, prompt: str, json_schema: dict = None):
+        """
+        Streams the model's output as text chunks.
+
+        Uses the Inference API's server-sent-events mode when the backend
+        supports it, so callers can stop consuming (and stop paying decode
+        latency) as soon as they have a complete JSON object. Falls back to
+        yielding the full run() output as a single chunk.
+
+        Goes through the same persistent cache as run(): a cached prompt is
+        yielded as one chunk without touching the network, and the JSON
+        object in a streamed response is stored for next time. A completed
+        stream with no valid JSON gets one feedback retry via run().
+
+        Args:
+            prompt (str): The input prompt for the model.
+            json_schema (dict, optional): JSON schema for guided decoding.
+
+        Yields:
+            str: Generated text fragments in arrival order.
+        """
+        prompt = self._truncate_prompt(prompt)
+
+        cache_key = self._cache_key(prompt)
+        cached = llm_cache.get(cache_key, self.cache_dir)
+        if cached is not None:
+            yield cached
+            return
+
+        payload = {"inputs": prompt, "parameters": self._params, "stream": True}
+        if json_schema is not None:
+            payload["parameters"] = dict(self._params, grammar={"type": "json", "value": json_schema})
+
+        try:
+            response = self._post_json(payload, stream=True)
+            response.raise_for_status()
+
+            if "text/event-stream" not in response.headers.get("content-type", ""):
+                # Backend ignored the stream flag and sent a plain JSON body
+                # (the serverless API's normal behaviour). The generation is
+                # already paid for and sitting in this response, so parse it
+                # here instead of discarding it and re-running the whole
+                # inference through run()
+                try:
+                    api_response = _loads(_read_json_body(response))
+                    generated_text = api_response[0].get("generated_text", "")
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    yield self._handle_request_error(e, response)
+                    return
+                clean_response = self._cache_if_valid(cache_key, generated_text)
+                if clean_response is None:
+                    # No valid JSON in the body; reuse run()'s feedback retry
+                    clean_response = self.run(
+                        _feedback_prompt(prompt, generated_text) if generated_text else prompt,
+                        json_schema=json_schema,
+                    )
+                yield clean_response
+                return
+
+            chunks = []
+            try:
+                for line in response.iter_lines():
+                    if not line or not line.startswith(b"data:"):
+                        continue
+                    data = line[len(b"data:"):].strip()
+                    if data == b"[DONE]":
+                        break
+                    try:
+                        event = json.loads(data)
+                    except ValueError:
+                        continue
+                    token_text = event.get("token", {}).get("text", "")
+                    if token_text:
+                        chunks.append(token_text)
+                        yield token_text
+            finally:
+                # Runs whether the caller drains the stream or stops early
+                # at its JSON object, so valid output is cached either way
+                response.close()
+                streamed = ''.join(chunks)
+                clean_response = self._cache_if_valid(cache_key, streamed)
+
+            if clean_response is None:
+                # The full stream held no valid JSON object; retry once
+                # through the non-streaming path with the failure fed back
+                retry_prompt = _feedback_prompt(prompt, streamed) if streamed else prompt
+                yield self.run(retry_prompt, json_schema=json_schema)
+
+        except requests.exceptions.RequestException:
+            yield self.run(prompt, json_schema=json_schema)
+
+    def _handle_request_error(self, e, response) -> str:
+        """Log a failed API call and build the standard error JSON string."""
+        logger.error("Error calling Inference API (%s): %s", type(e).__name__, e)
+
+        if response is not None:
+            logger.error("Response status %s: %s", response.status_code, response.text)
+            error_details = response.text
+        elif isinstance(e, CircuitOpenError):
+            error_details = str(e)
+        else:
+            error_details = "No response from server. Check network connection/firewall."
+
+        # A real serializer escapes backslashes/newlines/control chars too;
+        # the old f-string + manual quote replace produced invalid JSON for
+        # bodies containing any of those (e.g. HTML gateway error pages)
+        error_payload = {"error": "API request failed.", "details": error_details}
+        if orjson is not None:
+            return orjson.dumps(error_payload).decode()
+        return json.dumps(error_payload)
+
+@functools.lru_cache(maxsize=1)
+def get_llm_model() -> LlamaModel:
+    """Return the shared client instance, constructing it on first use.
+
+    Building the client at import time made every import of this module
+    (including test collection) require HUGGING_FACE_TOKEN to be set.
+    """
+    return LlamaModel()
+
+def __getattr__(name):
+    # PEP 562 lazy attribute: `from models.llama_model import llm_model`
+    # keeps working, but the client is only constructed when first touched
+    if name == "llm_model":
+        return get_llm_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,38 @@
+"""
+Persistent response cache for LLM calls.
+
+Responses are stored one file per key under the cache directory, so an
+identical prompt skips the multi-second Inference API round-trip even
+across process restarts (re-uploaded invoices, test reruns, dev
+iteration). Keys are content hashes computed by the caller.
+"""
+
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join("data", "llm_cache")
+
+
+def get(key: str, cache_dir: str = DEFAULT_CACHE_DIR):
+    """Return the cached response for key, or None on a miss."""
+    try:
+        with open(os.path.join(cache_dir, f"{key}.json"), "r", encoding="utf-8") as cache_file:
+            return cache_file.read()
+    except OSError:
+        return None
+
+
+def set(key: str, response: str, cache_dir: str = DEFAULT_CACHE_DIR) -> None:
+    """Store a response under key, creating the cache directory on demand.
+
+    Failures are logged and swallowed: a broken cache should never break
+    the request that produced the response.
+    """
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(os.path.join(cache_dir, f"{key}.json"), "w", encoding="utf-8") as cache_file:
+            cache_file.write(response)
+    except OSError as error:
+        logger.warning("Could not write LLM cache entry %s: %s", key, error)
@@ -1,82 +1,85 @@
-import unittest
-from unittest.mock import patch, MagicMock
-from io import BytesIO
-import pypdf
-import json
-
-# Add project root to path to allow imports
-import sys
-import os
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
-from core.parser import parse_invoice, extract_text_from_pdf
-
-class TestInvoiceParser(unittest.TestCase):
-
-    def create_dummy_pdf(self) -> BytesIO:
-        """Creates a dummy in-memory PDF for testing."""
-        writer = pypdf.PdfWriter()
-        writer.add_blank_page(width=612, height=792) # Standard letter size
-        
-        # In a real test, you might add text here, but for this, we'll mock extract_text
-        pdf_buffer = BytesIO()
-        writer.write(pdf_buffer)
-        pdf_buffer.seek(0)
-        return pdf_buffer
-
-    @patch('core.parser.extract_text_from_pdf')
-    @patch('core.parser.llm_model.run')
-    def test_parse_invoice_success(self, mock_llm_run, mock_extract_text):
-        """
-        Test the end-to-end parsing process with mocked dependencies.
-        """
-        # --- Arrange ---
-        # Mock the text extraction to return some sample text
-        mock_extract_text.return_value = "Invoice #123. Vendor: Test Corp. Total: $99.99"
-        
-        # Mock the LLM response
-        mock_llm_response = {
-            "invoice_number": "123",
-            "vendor_name": "Test Corp",
-            "total_amount": 99.99
-        }
-        mock_llm_run.return_value = json.dumps(mock_llm_response)
-        
-        # Create a dummy PDF file
-        dummy_pdf = self.create_dummy_pdf()
-        user_prompt = "Extract invoice number, vendor name, and total."
-
-        # --- Act ---
-        result = parse_invoice(dummy_pdf, user_prompt)
-
-        # --- Assert ---
-        self.assertTrue(result.get('success'))
-        self.assertIn('data', result)
-        self.assertEqual(result['data']['invoice_number'], "123")
-        self.assertEqual(result['data']['vendor_name'], "Test Corp")
-        self.assertEqual(result['data']['total_amount'], 99.99)
-        
-        # Verify that our mocks were called
-        mock_extract_text.assert_called_once()
-        mock_llm_run.assert_called_once()
-
-    def test_extract_text_from_pdf(self):
-        """
-        A more direct test for text extraction (though limited without a real file).
-        This mainly tests the function's structure.
-        """
-        # --- Arrange ---
-        # We can't easily add text to a pypdf object in memory for extraction,
-        # so we'll test the error case for an empty/image PDF.
-        dummy_pdf = self.create_dummy_pdf()
-
-        # --- Act ---
-        text = extract_text_from_pdf(dummy_pdf)
-
-        # --- Assert ---
-        # Since the blank PDF has no text, we expect the error message.
-        self.assertIn("Could not extract any text", text)
-
-if __name__ == '__main__':
-    unittest.main()
-
+import json
+from io import BytesIO
+from unittest.mock import MagicMock, patch
+
+import pypdf
+import pytest
+
+# Add project root to path to allow imports
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import core.parser
+from core.parser import parse_invoice
+
+
+@pytest.fixture(scope="session")
+def dummy_pdf_bytes() -> bytes:
+    """Raw bytes of a one-page blank PDF, built once for the whole session.
+
+    pypdf's writer setup dominates the cost here, so tests share the bytes
+    and wrap them in a fresh BytesIO when they need a file-like object.
+    """
+    writer = pypdf.PdfWriter()
+    writer.add_blank_page(width=612, height=792)  # Standard letter size
+    pdf_buffer = BytesIO()
+    writer.write(pdf_buffer)
+    return pdf_buffer.getvalue()
+
+
+@pytest.fixture
+def mock_llm_model():
+    """A parser pipeline backed by a mocked LLM client.
+
+    Patches the LlamaModel class (which InvoiceParser imports lazily) so no
+    API token or network is needed, and clears the module-level parser and
+    result caches so tests stay independent under parallel/repeat runs.
+    """
+    with patch("models.llama_model.LlamaModel") as mock_model_cls:
+        mock_model = MagicMock()
+        # Force parse_invoice down the plain run() path instead of streaming
+        mock_model.stream_response = None
+        mock_model_cls.return_value = mock_model
+
+        core.parser._get_parser.cache_clear()
+        core.parser._RESULT_CACHE.clear()
+        yield mock_model
+        core.parser._get_parser.cache_clear()
+        core.parser._RESULT_CACHE.clear()
+
+
+def test_parse_invoice_success(dummy_pdf_bytes, mock_llm_model):
+    """End-to-end parse with mocked text extraction and LLM response."""
+    mock_llm_response = {
+        "invoice_number": "123",
+        "vendor_name": "Test Corp",
+        "total_amount": 99.99
+    }
+    mock_llm_model.run.return_value = json.dumps(mock_llm_response)
+
+    user_prompt = "Extract invoice number, vendor name, and total."
+
+    with patch.object(
+        core.parser.InvoiceParser, "extract_text_from_pdf",
+        return_value="Invoice #123. Vendor: Test Corp. Total: $99.99"
+    ) as mock_extract_text:
+        result = parse_invoice(BytesIO(dummy_pdf_bytes), user_prompt)
+
+    assert result.get("success")
+    assert "data" in result
+    assert result["data"]["invoice_number"] == "123"
+    assert result["data"]["vendor_name"] == "Test Corp"
+    assert result["data"]["total_amount"] == 99.99
+
+    # Verify that our mocks were called
+    mock_extract_text.assert_called_once()
+    mock_llm_model.run.assert_called_once()
+
+
+def test_extract_text_from_pdf_blank_page(dummy_pdf_bytes, mock_llm_model):
+    """A blank PDF has no text, so extraction should raise the standard error."""
+    parser = core.parser._get_parser()
+
+    with pytest.raises(Exception, match="Failed to extract text from PDF"):
+        parser.extract_text_from_pdf(BytesIO(dummy_pdf_bytes))